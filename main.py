@@ -1,13 +1,25 @@
 # main.py
 import os
 import csv
+import hmac
+import io
+import logging
+import queue
 import sqlite3
 import threading
-from fastapi import FastAPI, Header, HTTPException, Request
+import time
+import atexit
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+import orjson
+from fastapi import FastAPI, HTTPException, Query, Request, Response, Security
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
+from fastapi.security import APIKeyHeader
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
+from datetime import datetime, timedelta
 
 # -------------------------
 # CONFIG
@@ -16,68 +28,249 @@ DB_PATH = os.environ.get("BEASTBET_DB", "beastbet_master.db")
 MASTER_CSV = os.environ.get("BEASTBET_CSV", "beastbet_master.csv")
 API_KEY = os.environ.get("BEASTBET_API_KEY", "supersecret_change_me")  # set in Render env
 ALLOW_ORIGINS = ["*"]  # replace with specific origins if you want
+DB_POOL_SIZE = int(os.environ.get("BEASTBET_DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = 10.0  # seconds to wait for a free connection before answering 503
+CSV_FLUSH_INTERVAL = 1.0  # seconds between background CSV flushes
+CSV_BUFFER_BYTES = 1 << 16  # pending CSV bytes that wake the flusher before the next interval
+SHOW_MATCHES_MAX_LIMIT = 1000  # upper bound for /show_matches/?limit=
+MATCH_CACHE_SIZE = 4096  # /predict/ match cache entries (LRU)
+MATCH_CACHE_TTL = 2.0  # seconds; bounds how long another worker's upsert can go unseen by /predict/
+BULK_UPSERT_ROWS = 100  # rows per multi-row INSERT; 8 params each stays under SQLite's 999-variable floor
 
 # -------------------------
-# APP + CORS
+# APP
 # -------------------------
-app = FastAPI(title="BeastBet Cloud API")
+class OrjsonResponse(JSONResponse):
+    # one C pass from dict to bytes; fastapi.responses.ORJSONResponse is deprecated upstream
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=ALLOW_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app = FastAPI(title="BeastBet Cloud API", default_response_class=OrjsonResponse)
 
 # -------------------------
 # DB init + concurrency lock
 # -------------------------
 _write_lock = threading.Lock()
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+def _connect():
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
     conn.execute("PRAGMA journal_mode=WAL;")
+    # WAL makes NORMAL durable across app crashes; fsync only happens at checkpoint
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA cache_size=-64000;")  # ~64MB page cache
+    conn.execute("PRAGMA mmap_size=268435456;")  # 256MB
+    conn.execute("PRAGMA busy_timeout=5000;")
     conn.row_factory = sqlite3.Row
     return conn
 
+# connections are opened once and reused; endpoints borrow one via acquire()
+_pool = queue.Queue(maxsize=DB_POOL_SIZE)
+
+def init_pool():
+    for _ in range(DB_POOL_SIZE):
+        _pool.put_nowait(_connect())
+
+@contextmanager
+def acquire():
+    try:
+        conn = _pool.get(timeout=DB_POOL_TIMEOUT)
+    except queue.Empty:
+        raise HTTPException(status_code=503, detail="Database busy, try again")
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _pool.put_nowait(conn)
+
+SCHEMA_MATCHES = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        match_id INTEGER PRIMARY KEY,
+        home TEXT,
+        away TEXT,
+        odds_h REAL,
+        odds_x REAL,
+        odds_a REAL,
+        source TEXT,
+        created_at INTEGER  -- ns since epoch (UTC)
+    )
+"""
+SCHEMA_RESULTS = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        match_id INTEGER,
+        ht_score TEXT,
+        ft_score TEXT,
+        result_at INTEGER,  -- ns since epoch (UTC)
+        source TEXT
+    )
+"""
+
+def _column_type(conn, table, column):
+    for row in conn.execute(f"PRAGMA table_info({table})"):
+        if row["name"] == column:
+            return row["type"].upper()
+
+def _rebuild_with_int_timestamp(conn, table, schema, ts_column):
+    # Tables created before timestamps were ints have a TEXT timestamp column, and
+    # CREATE TABLE IF NOT EXISTS won't change that: ints stored there come back as text.
+    # Copy into a table with INTEGER affinity, turning ISO strings into ns on the way.
+    cols = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+    select = ", ".join(
+        f"CASE WHEN {c} GLOB '[0-9][0-9][0-9][0-9]-*' "
+        f"THEN CAST(strftime('%s', {c}) AS INTEGER) * 1000000000 "
+        f"ELSE CAST({c} AS INTEGER) END" if c == ts_column else c
+        for c in cols
+    )
+    conn.execute(schema.format(table=f"{table}_new"))
+    conn.execute(f"INSERT INTO {table}_new ({', '.join(cols)}) SELECT {select} FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
 def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS matches (
-            match_id INTEGER PRIMARY KEY,
-            home TEXT,
-            away TEXT,
-            odds_h REAL,
-            odds_x REAL,
-            odds_a REAL,
-            source TEXT,
-            created_at TEXT
-        )
-    """)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS results (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            match_id INTEGER,
-            ht_score TEXT,
-            ft_score TEXT,
-            result_at TEXT,
-            source TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    with acquire() as conn:
+        # schema + migration are all-or-nothing. IMMEDIATE takes the write lock before the
+        # column types are read, so workers starting together queue on busy_timeout and the
+        # later ones see the already-migrated schema instead of failing to upgrade a stale read.
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(SCHEMA_MATCHES.format(table="matches"))
+        conn.execute(SCHEMA_RESULTS.format(table="results"))
+        if _column_type(conn, "matches", "created_at") != "INTEGER":
+            _rebuild_with_int_timestamp(conn, "matches", SCHEMA_MATCHES, "created_at")
+        if _column_type(conn, "results", "result_at") != "INTEGER":
+            _rebuild_with_int_timestamp(conn, "results", SCHEMA_RESULTS, "result_at")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_created_at ON matches(created_at DESC)")
+        conn.commit()
+
+# -------------------------
+# Timestamps: stored as int ns, formatted as ISO only for CSV and responses
+# -------------------------
+_EPOCH = datetime(1970, 1, 1)
+_ts_cache = (0, "")
+
+def ns_to_datetime(ns: Optional[int]):
+    if ns is None:
+        return None
+    return _EPOCH + timedelta(microseconds=ns // 1000)
+
+def csv_timestamp(ns: int) -> str:
+    # CSV history keeps 1s resolution, so the ISO string only has to be built once per second
+    global _ts_cache
+    sec = ns // 1_000_000_000
+    if _ts_cache[0] != sec:
+        _ts_cache = (sec, (_EPOCH + timedelta(seconds=sec)).isoformat())
+    return _ts_cache[1]
 
 # ensure csv exists (header)
+CSV_HEADER = ["match_id","home","away","odds_h","odds_x","odds_a","source","created_at"]
+
 def init_csv():
     if not os.path.exists(MASTER_CSV):
         with open(MASTER_CSV, "w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
-            writer.writerow(["match_id","home","away","odds_h","odds_x","odds_a","source","created_at"])
+            writer.writerow(CSV_HEADER)
+
+# Rows are csv-encoded in memory by append_csv_rows() and written by flush_csv() with a
+# single os.write() on an O_APPEND fd, so every write() ends on a row boundary: several
+# uvicorn workers appending to the same file can't interleave half-rows.
+# Writers call append_csv_rows() while holding _write_lock, so it never touches the file:
+# _csv_lock only guards the in-memory buffer, and the write/fsync/close happen under
+# _csv_io_lock, which writers never take.
+logger = logging.getLogger("beastbet")
+
+_csv_lock = threading.Lock()
+_csv_io_lock = threading.Lock()
+_csv_flush_now = threading.Event()
+_csv_fd = None
+_csv_encoded = io.StringIO()
+_csv_writer = csv.writer(_csv_encoded)
+_csv_pending = []
+_csv_pending_bytes = 0
+
+def open_csv():
+    global _csv_fd
+    _csv_fd = os.open(MASTER_CSV, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+def close_csv():
+    global _csv_fd
+    with _csv_io_lock:
+        if _csv_fd is None:
+            return
+        _flush_csv_locked()
+        os.close(_csv_fd)
+        _csv_fd = None
+
+def append_csv_row(row: dict):
+    append_csv_rows([row])
+
+def append_csv_rows(rows: List[dict]):
+    # keep column order pinned to CSV_HEADER; created_at arrives as int ns
+    global _csv_pending_bytes
+    with _csv_lock:
+        _csv_writer.writerows(
+            [csv_timestamp(row[k]) if k == "created_at" else row.get(k) for k in CSV_HEADER]
+            for row in rows
+        )
+        data = _csv_encoded.getvalue().encode("utf-8")
+        _csv_encoded.seek(0)
+        _csv_encoded.truncate()
+        _csv_pending.append(data)
+        _csv_pending_bytes += len(data)
+        full = _csv_pending_bytes >= CSV_BUFFER_BYTES
+    if full:
+        _csv_flush_now.set()  # the write itself happens on the flusher thread
+
+def _take_pending_csv() -> bytes:
+    global _csv_pending_bytes
+    with _csv_lock:
+        data = b"".join(_csv_pending)
+        _csv_pending.clear()
+        _csv_pending_bytes = 0
+    return data
+
+def _requeue_csv(data: bytes):
+    # put bytes that didn't reach the file back in front of rows appended since
+    global _csv_pending_bytes
+    with _csv_lock:
+        _csv_pending.insert(0, data)
+        _csv_pending_bytes += len(data)
+
+def _flush_csv_locked():
+    # caller holds _csv_io_lock
+    data = memoryview(_take_pending_csv())
+    if not data:
+        return
+    try:
+        while data:
+            data = data[os.write(_csv_fd, data):]
+    except OSError:
+        _requeue_csv(bytes(data))  # e.g. ENOSPC: keep the rows for the next flush
+        raise
+    os.fsync(_csv_fd)
+
+def flush_csv():
+    with _csv_io_lock:
+        if _csv_fd is not None:
+            _flush_csv_locked()
+
+def _csv_flusher():
+    while True:
+        _csv_flush_now.wait(CSV_FLUSH_INTERVAL)
+        _csv_flush_now.clear()
+        try:
+            flush_csv()
+        except Exception:
+            # keep the thread alive; unwritten rows stay buffered and are retried next round
+            logger.exception("master CSV flush failed")
 
+init_pool()
 init_db()
 init_csv()
+open_csv()
+threading.Thread(target=_csv_flusher, name="csv-flusher", daemon=True).start()
+atexit.register(close_csv)
 
 # -------------------------
 # Pydantic models
@@ -86,9 +279,9 @@ class MatchIn(BaseModel):
     match_id: int
     home: str
     away: str
-    odds_h: float
-    odds_x: float
-    odds_a: float
+    odds_h: float = Field(gt=1.0)  # decimal odds must be > 1.0
+    odds_x: float = Field(gt=1.0)
+    odds_a: float = Field(gt=1.0)
     source: Optional[str] = "client"  # optional source tag (client id, EXE id, etc.)
 
 class ResultIn(BaseModel):
@@ -102,142 +295,213 @@ class BulkMatchesIn(BaseModel):
     source: Optional[str] = "bulk"
 
 # -------------------------
-# AUTH utility
+# AUTH + CORS middleware
 # -------------------------
-def require_api_key(x_api_key: Optional[str]):
-    if not x_api_key:
-        raise HTTPException(status_code=401, detail="Missing API key")
-    if x_api_key != API_KEY:
-        raise HTTPException(status_code=403, detail="Invalid API key")
+PROTECTED_PREFIXES = ("/add_", "/upload_", "/show_", "/get_", "/download_", "/predict")
+
+@app.middleware("http")
+async def require_api_key(request: Request, call_next):
+    if request.url.path.startswith(PROTECTED_PREFIXES):
+        x_api_key = request.headers.get("x-api-key")
+        if not x_api_key:
+            return OrjsonResponse({"detail": "Missing API key"}, status_code=401)
+        # constant-time compare so the key can't be guessed byte by byte
+        if not hmac.compare_digest(x_api_key.encode(), API_KEY.encode()):
+            return OrjsonResponse({"detail": "Invalid API key"}, status_code=403)
+    return await call_next(request)
+
+# the middleware enforces the key; this only declares the x-api-key header in OpenAPI so /docs can send it
+API_KEY_DOCS = [Security(APIKeyHeader(name="x-api-key", auto_error=False))]
+
+# registered after auth so it is the outer layer: preflights and 401/403s still get CORS headers
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=ALLOW_ORIGINS,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# -------------------------
+# SQL statements (fixed strings so sqlite3's statement cache reuses the prepared plans)
+# -------------------------
+_SQL_INSERT_MATCHES = """
+    INSERT INTO matches (match_id, home, away, odds_h, odds_x, odds_a, source, created_at)
+    VALUES """
+_SQL_MATCH_PLACEHOLDERS = "(?, ?, ?, ?, ?, ?, ?, ?)"
+_SQL_ON_CONFLICT_MATCH = """
+    ON CONFLICT(match_id) DO UPDATE SET
+        home=excluded.home, away=excluded.away,
+        odds_h=excluded.odds_h, odds_x=excluded.odds_x, odds_a=excluded.odds_a,
+        source=excluded.source, created_at=excluded.created_at
+"""
+SQL_UPSERT_MATCH = _SQL_INSERT_MATCHES + _SQL_MATCH_PLACEHOLDERS + _SQL_ON_CONFLICT_MATCH
+SQL_INSERT_RESULT = """
+    INSERT INTO results (match_id, ht_score, ft_score, result_at, source)
+    VALUES (?, ?, ?, ?, ?)
+"""
+SQL_SELECT_MATCH = "SELECT * FROM matches WHERE match_id=?"
+SQL_LIST_MATCHES = "SELECT * FROM matches ORDER BY created_at DESC LIMIT ?"
+
+@lru_cache(maxsize=None)
+def sql_upsert_matches(n: int) -> str:
+    # multi-row UPSERT; at most BULK_UPSERT_ROWS distinct strings, each cached by sqlite3 too
+    return _SQL_INSERT_MATCHES + ",".join([_SQL_MATCH_PLACEHOLDERS] * n) + _SQL_ON_CONFLICT_MATCH
+
+# -------------------------
+# PREDICT cache
+# -------------------------
+# match_id -> (expires_at, fields /predict/ needs), kept as an LRU of MATCH_CACHE_SIZE.
+# The cache is per process: with several workers an upsert only refreshes its own worker's
+# entry, so entries expire after MATCH_CACHE_TTL to bound how stale the others can get.
+# A predict() miss gets a fill token for its match_id; an upsert of that match drops the
+# token, so a slow read can't put stale odds back after an eviction, while upserts of
+# other matches leave the fill alone.
+PREDICT_FIELDS = ("match_id", "home", "away", "odds_h", "odds_x", "odds_a")
+_match_cache = OrderedDict()
+_match_cache_lock = threading.Lock()
+_match_fills = {}  # match_id -> token of the predict() read allowed to fill it
+
+def _store_match(match_id: int, fields: dict):
+    # caller holds _match_cache_lock
+    _match_cache[match_id] = (time.monotonic() + MATCH_CACHE_TTL, fields)
+    _match_cache.move_to_end(match_id)
+    if len(_match_cache) > MATCH_CACHE_SIZE:
+        _match_cache.popitem(last=False)
+
+def cache_matches(rows: List[dict]):
+    with _match_cache_lock:
+        for row in rows:
+            _match_fills.pop(row["match_id"], None)
+            _store_match(row["match_id"], {k: row[k] for k in PREDICT_FIELDS})
+
+def cached_match(match_id: int):
+    # returns (fields, None) on a hit, (None, token to hand back to fill_match_cache) on a miss
+    with _match_cache_lock:
+        entry = _match_cache.get(match_id)
+        if entry is not None and entry[0] >= time.monotonic():
+            _match_cache.move_to_end(match_id)
+            return entry[1], None
+        _match_cache.pop(match_id, None)
+        token = _match_fills[match_id] = object()
+        return None, token
+
+def fill_match_cache(match_id: int, fields: Optional[dict], token: object):
+    # fields=None just releases the token (e.g. the match doesn't exist)
+    with _match_cache_lock:
+        if _match_fills.get(match_id) is token:
+            del _match_fills[match_id]
+            if fields is not None:
+                _store_match(match_id, fields)
+
+@lru_cache(maxsize=4096)
+def _compute_pick(odds_h: float, odds_x: float, odds_a: float) -> Tuple[str, float, float]:
+    # Simple pick-by-lowest-odds (you can replace with your model later)
+    odds = {"HOME": odds_h, "DRAW": odds_x, "AWAY": odds_a}
+    pick = min(odds, key=odds.get)
+    confidence = round(max(0.5, min(0.95, 1.0 / odds[pick])), 2)
+    return pick, confidence, odds[pick]
 
 # -------------------------
 # HELPERS: insert, dedupe, csv append
 # -------------------------
 def insert_or_update_match(match: MatchIn):
     # Acquire lock to protect sqlite + csv consistency
-    with _write_lock:
-        conn = get_conn()
-        cur = conn.cursor()
-        # Check if match exists
-        cur.execute("SELECT * FROM matches WHERE match_id=?", (match.match_id,))
-        existing = cur.fetchone()
-        now = datetime.utcnow().isoformat()
-        if existing:
-            # update odds and metadata
-            cur.execute("""
-                UPDATE matches
-                SET home=?, away=?, odds_h=?, odds_x=?, odds_a=?, source=?, created_at=?
-                WHERE match_id=?
-            """, (match.home, match.away, match.odds_h, match.odds_x, match.odds_a, match.source, now, match.match_id))
-            conn.commit()
-            conn.close()
-            # also append a line to CSV with updated_at (keeps history)
-            with open(MASTER_CSV, "a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([match.match_id, match.home, match.away, match.odds_h, match.odds_x, match.odds_a, match.source, now])
-            return {"status": "updated", "match_id": match.match_id}
-        else:
-            cur.execute("""
-                INSERT INTO matches (match_id, home, away, odds_h, odds_x, odds_a, source, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (match.match_id, match.home, match.away, match.odds_h, match.odds_x, match.odds_a, match.source, now))
-            conn.commit()
-            conn.close()
-            with open(MASTER_CSV, "a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([match.match_id, match.home, match.away, match.odds_h, match.odds_x, match.odds_a, match.source, now])
-            return {"status": "inserted", "match_id": match.match_id}
+    row = {**match.model_dump(), "created_at": time.time_ns()}
+    with _write_lock, acquire() as conn:
+        # single UPSERT: insert new match or refresh odds and metadata of an existing one
+        conn.execute(SQL_UPSERT_MATCH, tuple(row[k] for k in CSV_HEADER))
+        conn.commit()
+        cache_matches([row])
+        # also append a line to CSV with updated_at (keeps history)
+        append_csv_row(row)
+    return {"status": "upserted", "match_id": match.match_id}
+
+def insert_or_update_many(matches: List[MatchIn]):
+    # One lock, one transaction and one CSV buffer push for the whole batch
+    now = time.time_ns()
+    rows = [{**m.model_dump(), "created_at": now} for m in matches]
+    with _write_lock, acquire() as conn:
+        for i in range(0, len(rows), BULK_UPSERT_ROWS):
+            chunk = rows[i:i + BULK_UPSERT_ROWS]
+            conn.execute(sql_upsert_matches(len(chunk)), [r[k] for r in chunk for k in CSV_HEADER])
+        conn.commit()
+        cache_matches(rows)
+        append_csv_rows(rows)
+    return [{"status": "upserted", "match_id": m.match_id} for m in matches]
 
 def insert_result(result: ResultIn):
-    with _write_lock:
-        conn = get_conn()
+    with _write_lock, acquire() as conn:
         cur = conn.cursor()
-        now = datetime.utcnow().isoformat()
-        cur.execute("""
-            INSERT INTO results (match_id, ht_score, ft_score, result_at, source)
-            VALUES (?, ?, ?, ?, ?)
-        """, (result.match_id, result.ht_score, result.ft_score, now, result.source))
+        now = time.time_ns()
+        cur.execute(SQL_INSERT_RESULT, (result.match_id, result.ht_score, result.ft_score, now, result.source))
         conn.commit()
-        conn.close()
         # Optionally: append to master CSV as a separate result history file or same CSV (we keep match CSV separate)
         return {"status": "inserted_result", "match_id": result.match_id}
 
 # -------------------------
 # ROUTES
 # -------------------------
-@app.post("/add_match/")
-async def add_match(match: MatchIn, x_api_key: Optional[str] = Header(None)):
-    require_api_key(x_api_key)
-    # Basic validation
-    if match.odds_h <= 1 or match.odds_x <= 1 or match.odds_a <= 1:
-        raise HTTPException(status_code=400, detail="Odds must be > 1.0")
+@app.post("/add_match/", dependencies=API_KEY_DOCS)
+def add_match(match: MatchIn):
     return insert_or_update_match(match)
 
-@app.post("/add_result/")
-async def add_result(result: ResultIn, x_api_key: Optional[str] = Header(None)):
-    require_api_key(x_api_key)
+@app.post("/add_result/", dependencies=API_KEY_DOCS)
+def add_result(result: ResultIn):
     return insert_result(result)
 
-@app.post("/upload_matches/")
-async def upload_matches(payload: BulkMatchesIn, x_api_key: Optional[str] = Header(None)):
-    require_api_key(x_api_key)
-    responses = []
-    for m in payload.matches:
-        responses.append(insert_or_update_match(m))
+@app.post("/upload_matches/", dependencies=API_KEY_DOCS)
+def upload_matches(payload: BulkMatchesIn):
+    responses = insert_or_update_many(payload.matches)
     return {"status": "ok", "count": len(responses), "results": responses}
 
-@app.get("/show_matches/")
-async def show_matches(x_api_key: Optional[str] = Header(None)):
-    require_api_key(x_api_key)
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM matches ORDER BY created_at DESC")
-    rows = cur.fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
-
-@app.get("/get_master_csv/")
-async def get_master_csv(x_api_key: Optional[str] = Header(None)):
-    require_api_key(x_api_key)
+@app.get("/show_matches/", dependencies=API_KEY_DOCS)
+def show_matches(limit: int = Query(100, ge=1, le=SHOW_MATCHES_MAX_LIMIT)):
+    with acquire() as conn:
+        rows = conn.execute(SQL_LIST_MATCHES, (limit,)).fetchall()
+    # limit is capped, so encode the rows in one orjson pass straight to bytes
+    return Response(
+        orjson.dumps([{**r, "created_at": ns_to_datetime(r["created_at"])} for r in rows]),
+        media_type="application/json",
+    )
+
+@app.get("/get_master_csv/", dependencies=API_KEY_DOCS)
+async def get_master_csv():
     if not os.path.exists(MASTER_CSV):
         raise HTTPException(status_code=404, detail="Master CSV not found")
-    return {"download_url": f"/download_csv/"}  # small helper; actual file served on /download_csv/
+    return {"download_url": "/download_csv/"}  # small helper; actual file served on /download_csv/
 
-@app.get("/download_csv/")
-async def download_csv(x_api_key: Optional[str] = Header(None)):
-    require_api_key(x_api_key)
+@app.get("/download_csv/", dependencies=API_KEY_DOCS)
+def download_csv():
     if not os.path.exists(MASTER_CSV):
         raise HTTPException(status_code=404, detail="Master CSV not found")
-    # Serve as plain text CSV
-    return RequestResponseFile(MASTER_CSV)
-
-# Small helper to return file content (keeps dependencies minimal)
-from fastapi.responses import FileResponse
-def RequestResponseFile(path):
-    return FileResponse(path, media_type="text/csv", filename=os.path.basename(path))
+    flush_csv()  # include rows still sitting in the buffer
+    # Serve as plain text CSV; a pre-computed stat lets Starlette skip its own stat before streaming
+    return FileResponse(MASTER_CSV, media_type="text/csv", filename=os.path.basename(MASTER_CSV),
+                        stat_result=os.stat(MASTER_CSV))
 
 # A simple predict endpoint (optional/simple)
-@app.get("/predict/{match_id}")
-async def predict(match_id: int, x_api_key: Optional[str] = Header(None)):
-    require_api_key(x_api_key)
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM matches WHERE match_id=?", (match_id,))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        raise HTTPException(status_code=404, detail="Match not found")
-    # Simple pick-by-lowest-odds (you can replace with your model later)
-    odds = {"HOME": row["odds_h"], "DRAW": row["odds_x"], "AWAY": row["odds_a"]}
-    pick = min(odds, key=odds.get)
-    confidence = round(max(0.5, min(0.95, 1.0 / odds[pick])), 2)
+@app.get("/predict/{match_id}", dependencies=API_KEY_DOCS)
+def predict(match_id: int):
+    match, token = cached_match(match_id)
+    if match is None:
+        with acquire() as conn:
+            cur = conn.cursor()
+            cur.execute(SQL_SELECT_MATCH, (match_id,))
+            row = cur.fetchone()
+        if not row:
+            fill_match_cache(match_id, None, token)
+            raise HTTPException(status_code=404, detail="Match not found")
+        match = {k: row[k] for k in PREDICT_FIELDS}
+        fill_match_cache(match_id, match, token)
+    pick, confidence, odds_used = _compute_pick(match["odds_h"], match["odds_x"], match["odds_a"])
     return {
-        "match_id": row["match_id"],
-        "home": row["home"],
-        "away": row["away"],
+        "match_id": match["match_id"],
+        "home": match["home"],
+        "away": match["away"],
         "pick": pick,
         "confidence": confidence,
-        "odds_used": odds[pick]
+        "odds_used": odds_used
     }
 
 # Health check root (render shows 404 for /, better to return a simple message)
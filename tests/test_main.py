@@ -0,0 +1,222 @@
+import importlib
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+# schema as created by releases that stored timestamps as ISO text
+BASELINE_SCHEMA = """
+    CREATE TABLE matches (
+        match_id INTEGER PRIMARY KEY,
+        home TEXT,
+        away TEXT,
+        odds_h REAL,
+        odds_x REAL,
+        odds_a REAL,
+        source TEXT,
+        created_at TEXT
+    );
+    CREATE TABLE results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        match_id INTEGER,
+        ht_score TEXT,
+        ft_score TEXT,
+        result_at TEXT,
+        source TEXT
+    );
+    INSERT INTO matches VALUES (1, 'Home FC', 'Away FC', 1.8, 3.4, 4.2, 'client', '2025-01-01T12:00:00.123456');
+    INSERT INTO results (match_id, ht_score, ft_score, result_at, source) VALUES (1, '1-0', '2-1', '2025-01-01T14:00:00', 'client');
+"""
+
+
+API_KEY = "test-key"
+
+
+def start_app(monkeypatch, tmp_path):
+    monkeypatch.setenv("BEASTBET_DB", str(tmp_path / "master.db"))
+    monkeypatch.setenv("BEASTBET_CSV", str(tmp_path / "master.csv"))
+    monkeypatch.setenv("BEASTBET_API_KEY", API_KEY)
+    sys.modules.pop("main", None)
+    return importlib.import_module("main")
+
+
+@pytest.fixture
+def main(monkeypatch, tmp_path):
+    module = start_app(monkeypatch, tmp_path)
+    yield module
+    module.close_csv()
+
+
+@pytest.fixture
+def client(main):
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    return TestClient(main.app)
+
+
+def test_restart_on_baseline_db_keeps_timestamps(monkeypatch, tmp_path):
+    conn = sqlite3.connect(tmp_path / "master.db")
+    conn.executescript(BASELINE_SCHEMA)
+    conn.close()
+
+    main = start_app(monkeypatch, tmp_path)
+    main.insert_or_update_match(main.MatchIn(match_id=2, home="A", away="B", odds_h=2.0, odds_x=3.0, odds_a=3.5))
+    main.insert_result(main.ResultIn(match_id=2, ft_score="0-0"))
+    main.close_csv()
+
+    main = start_app(monkeypatch, tmp_path)
+    with main.acquire() as conn:
+        matches = conn.execute("SELECT match_id, created_at, typeof(created_at) AS t FROM matches ORDER BY match_id").fetchall()
+        results = conn.execute("SELECT match_id, result_at, typeof(result_at) AS t FROM results ORDER BY id").fetchall()
+
+    assert [r["t"] for r in matches] == ["integer", "integer"]
+    assert [r["t"] for r in results] == ["integer", "integer"]
+    assert matches[0]["created_at"] == 1735732800 * 10**9
+    assert results[0]["result_at"] == 1735740000 * 10**9
+    assert matches[1]["created_at"] > matches[0]["created_at"]
+
+    body = main.show_matches(limit=10).body
+    assert b'"created_at":"2025-01-01T12:00:00"' in body
+    main.close_csv()
+
+
+def test_concurrent_worker_startup_on_baseline_db(tmp_path):
+    conn = sqlite3.connect(tmp_path / "master.db")
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO matches VALUES (?, 'H', 'A', 1.8, 3.4, 4.2, 'client', '2025-01-01T12:00:00')",
+        [(i,) for i in range(2, 20001)],
+    )
+    conn.commit()
+    conn.close()
+
+    env = dict(os.environ, BEASTBET_DB=str(tmp_path / "master.db"), BEASTBET_CSV=str(tmp_path / "master.csv"))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workers = [
+        subprocess.Popen([sys.executable, "-c", "import main"], cwd=root, env=env, stderr=subprocess.PIPE)
+        for _ in range(6)
+    ]
+    for proc in workers:
+        _, err = proc.communicate(timeout=60)
+        assert proc.returncode == 0, err.decode()
+
+    conn = sqlite3.connect(tmp_path / "master.db")
+    types = conn.execute("SELECT typeof(created_at), count(*) FROM matches GROUP BY 1").fetchall()
+    conn.close()
+    assert types == [("integer", 20000)]
+
+
+def test_protected_route_without_key_is_401(client):
+    resp = client.get("/show_matches/")
+    assert resp.status_code == 401
+    assert resp.json() == {"detail": "Missing API key"}
+
+
+def test_protected_route_with_wrong_key_is_403(client):
+    resp = client.get("/show_matches/", headers={"x-api-key": "nope"})
+    assert resp.status_code == 403
+    assert resp.json() == {"detail": "Invalid API key"}
+
+
+def test_protected_route_with_valid_key(client):
+    resp = client.get("/show_matches/", headers={"x-api-key": API_KEY})
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+
+def test_root_needs_no_key(client):
+    resp = client.get("/")
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "ok"
+
+
+def test_rejected_request_keeps_cors_headers(client):
+    resp = client.get("/predict/1", headers={"Origin": "https://example.com"})
+    assert resp.status_code == 401
+    assert "access-control-allow-origin" in resp.headers
+
+
+def test_openapi_declares_api_key_header(client):
+    schema = client.get("/openapi.json").json()
+    schemes = schema["components"]["securitySchemes"].values()
+    assert {"type": "apiKey", "in": "header", "name": "x-api-key"} in schemes
+    assert schema["paths"]["/show_matches/"]["get"]["security"]
+
+
+def match_in(main, match_id, odds_h, odds_x=3.4, odds_a=4.2, home="Home FC"):
+    return main.MatchIn(match_id=match_id, home=home, away="Away FC", odds_h=odds_h, odds_x=odds_x, odds_a=odds_a)
+
+
+def test_upsert_invalidates_cached_prediction(main):
+    main.insert_or_update_match(match_in(main, 1, odds_h=1.5))
+    first = main.predict(1)
+    assert (first["pick"], first["odds_used"]) == ("HOME", 1.5)
+    assert main.predict(1) == first  # served from the cache
+
+    main.insert_or_update_match(match_in(main, 1, odds_h=6.0, odds_x=5.0, odds_a=1.4))
+    second = main.predict(1)
+    assert (second["pick"], second["odds_used"]) == ("AWAY", 1.4)
+
+
+def test_cache_fill_survives_upsert_of_another_match(main):
+    main.insert_or_update_match(match_in(main, 1, odds_h=1.5))
+    main._match_cache.clear()
+
+    fields, token = main.cached_match(1)
+    assert fields is None
+    main.insert_or_update_match(match_in(main, 2, odds_h=2.0))
+    main.fill_match_cache(1, {"match_id": 1, "home": "Home FC", "away": "Away FC", "odds_h": 1.5, "odds_x": 3.4, "odds_a": 4.2}, token)
+
+    assert main.cached_match(1)[0]["odds_h"] == 1.5
+
+
+def test_cache_fill_dropped_when_same_match_upserted(main):
+    main.insert_or_update_match(match_in(main, 1, odds_h=1.5))
+    main._match_cache.clear()
+
+    _, token = main.cached_match(1)
+    main.insert_or_update_match(match_in(main, 1, odds_h=2.5))
+    main.fill_match_cache(1, {"match_id": 1, "home": "Home FC", "away": "Away FC", "odds_h": 1.5, "odds_x": 3.4, "odds_a": 4.2}, token)
+
+    assert main.predict(1)["odds_used"] == 2.5
+
+
+def test_csv_rows_survive_failed_write(main, monkeypatch, tmp_path):
+    real_write = os.write
+
+    def full_disk(fd, data):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(main.os, "write", full_disk)
+    main.insert_or_update_match(match_in(main, 1, odds_h=1.5))
+    with pytest.raises(OSError):
+        main.flush_csv()
+
+    monkeypatch.setattr(main.os, "write", real_write)
+    main.flush_csv()
+    lines = (tmp_path / "master.csv").read_text().splitlines()
+    assert len(lines) == 2 and lines[1].startswith("1,Home FC,Away FC,1.5,")
+
+
+def test_bulk_upsert_across_chunks_with_duplicates(main):
+    assert main.BULK_UPSERT_ROWS == 100
+    batch = [match_in(main, i, odds_h=1.5) for i in range(1, 250)]
+    batch[20] = match_in(main, 10, odds_h=2.2, home="dup in chunk")  # same chunk as id 10
+    batch.append(match_in(main, 5, odds_h=3.3, home="dup across chunks"))  # 251st row, third chunk
+    assert len(batch) == 251
+
+    results = main.upload_matches(main.BulkMatchesIn(matches=batch))
+    assert results["count"] == 251
+
+    with main.acquire() as conn:
+        count = conn.execute("SELECT count(*) FROM matches").fetchone()[0]
+        dup_in = conn.execute("SELECT home, odds_h FROM matches WHERE match_id=10").fetchone()
+        dup_across = conn.execute("SELECT home, odds_h FROM matches WHERE match_id=5").fetchone()
+    assert count == 248  # ids 1..249 minus 21, which was replaced by the second id 10
+    assert tuple(dup_in) == ("dup in chunk", 2.2)
+    assert tuple(dup_across) == ("dup across chunks", 3.3)
+    assert main.predict(5)["odds_used"] == 3.3